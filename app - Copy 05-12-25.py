@@ -1,6 +1,9 @@
 # app.py - Full Gradio Web App with OpenAI Wrapper for Qwen API
 import os
+import functools
+import subprocess
 import gradio as gr
+import torch
 from modelscope.pipelines import pipeline
 from modelscope.utils.constant import Tasks
 from pydub import AudioSegment
@@ -13,8 +16,11 @@ from dotenv import load_dotenv
 # ========================================
 # Configure pydub to use ffmpeg (must be before any AudioSegment operations)
 # ========================================
-AudioSegment.converter = which("ffmpeg")  # Find and set ffmpeg path
-AudioSegment.ffprobe = which("ffprobe")    # Find and set ffprobe path
+# Resolved once at import; hot paths use these constants instead of searching PATH
+FFMPEG_PATH = which("ffmpeg")
+FFPROBE_PATH = which("ffprobe")
+AudioSegment.converter = FFMPEG_PATH  # Set ffmpeg path
+AudioSegment.ffprobe = FFPROBE_PATH   # Set ffprobe path
 
 # ========================================
 # Load Environment Variables
@@ -28,6 +34,33 @@ if not DASHSCOPE_API_KEY:
         "Please get your key at https://dashscope-intl.aliyuncs.com/compatible-mode/v1"
     )
 
+# ========================================
+# ASR Device & Pipeline (loaded once per process)
+# ========================================
+DEVICE = 'gpu' if torch.cuda.is_available() else 'cpu'
+ASR_MODEL = 'iic/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch'
+
+@functools.lru_cache(maxsize=1)
+def get_asr_pipeline(device=DEVICE):
+    """
+    Build the ModelScope Paraformer pipeline once and reuse it across requests.
+
+    Loading the model weights dominates per-request latency, so the pipeline is
+    cached for the lifetime of the process (lru_cache is thread-safe for Gradio).
+
+    Args:
+        device (str): Device to load the model on ('gpu' or 'cpu')
+
+    Returns:
+        Pipeline: ModelScope ASR pipeline
+    """
+    print(f"Loading ASR model on device: {device}")
+    return pipeline(
+        task='auto-speech-recognition',
+        model=ASR_MODEL,
+        device=device
+    )
+
 # ========================================
 # Initialize OpenAI client with DashScope base URL
 # ========================================
@@ -51,9 +84,18 @@ def convert_mp3_to_wav(mp3_path, wav_path):
         str: Path to converted WAV file
     """
     try:
-        audio = AudioSegment.from_mp3(mp3_path)
-        audio = audio.set_frame_rate(16000).set_channels(1)
-        audio.export(wav_path, format="wav")
+        if FFMPEG_PATH:
+            # Single ffmpeg pass: decode + resample + downmix straight to WAV
+            cmd = [FFMPEG_PATH, "-v", "error", "-y", "-i", mp3_path,
+                   "-ar", "16000", "-ac", "1", "-f", "wav", wav_path]
+            proc = subprocess.run(cmd, capture_output=True)
+            if proc.returncode != 0:
+                raise RuntimeError(proc.stderr.decode("utf-8", errors="ignore").strip())
+        else:
+            # Fallback: pydub (slower, decodes through Python)
+            audio = AudioSegment.from_mp3(mp3_path)
+            audio = audio.set_frame_rate(16000).set_channels(1)
+            audio.export(wav_path, format="wav")
         print(f"✅ Converted {mp3_path} to {wav_path}")
         return wav_path
     except Exception as e:
@@ -72,16 +114,9 @@ def transcribe_audio(wav_path):
     Returns:
         str: Transcribed Chinese text
     """
-    import torch  # Import here to avoid issues if not needed
+    print(f"Using device: {DEVICE}")
 
-    device = 'gpu' if torch.cuda.is_available() else 'cpu'
-    print(f"Using device: {device}")
-
-    asr_pipeline = pipeline(
-        task='auto-speech-recognition',
-        model='iic/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch',
-        device=device
-    )
+    asr_pipeline = get_asr_pipeline(DEVICE)
     result = asr_pipeline(wav_path)
 
     # Handle both list and dict output formats
@@ -278,8 +313,8 @@ with gr.Blocks(title="🎙️ Audio Translator (OpenAI Wrapper)") as demo:
 
 # Run the app
 if __name__ == "__main__":
-    import torch  # Import here to check device
     print("\n" + "=" * 60)
     print("🚀 Starting Gradio App (app2.py - OpenAI Wrapper)")
     print("=" * 60)
+    get_asr_pipeline(DEVICE)  # Load model before the first request
     demo.launch(share=False)  # Set share=True for public link
\ No newline at end of file
@@ -1,20 +1,43 @@
 # app.py - Full Gradio Web App with OpenAI Wrapper for Qwen API
 import os
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
+import json
+import math
+import re
+import subprocess
+import tempfile
+import threading
+import time
 import gradio as gr
+import httpx
+import numpy as np
+import soundfile as sf
+import torch
 from modelscope.pipelines import pipeline
 from modelscope.utils.constant import Tasks
 from pydub import AudioSegment
 from pydub.utils import which
-from openai import OpenAI  # New: OpenAI wrapper for Qwen
+from scipy.signal import resample_poly
+from tokenizers import Tokenizer
+from openai import OpenAI, AsyncOpenAI  # New: OpenAI wrapper for Qwen
 import markdown
 import datetime
+import diskcache
+from blake3 import blake3
 from dotenv import load_dotenv
 
 # ========================================
 # Configure pydub to use ffmpeg (must be before any AudioSegment operations)
 # ========================================
-AudioSegment.converter = which("ffmpeg")  # Find and set ffmpeg path
-AudioSegment.ffprobe = which("ffprobe")    # Find and set ffprobe path
+# Resolved once at import; hot paths use these constants instead of searching PATH
+FFMPEG_PATH = which("ffmpeg")
+FFPROBE_PATH = which("ffprobe")
+AudioSegment.converter = FFMPEG_PATH  # Set ffmpeg path
+AudioSegment.ffprobe = FFPROBE_PATH   # Set ffprobe path
 
 # ========================================
 # Load Environment Variables
@@ -28,46 +51,290 @@ if not DASHSCOPE_API_KEY:
         "Please get your key at https://dashscope-intl.aliyuncs.com/compatible-mode/v1"
     )
 
+# ========================================
+# ASR Device & Pipeline (loaded once per process)
+# ========================================
+DEVICE = 'cuda:0' if torch.cuda.is_available() else 'cpu'
+ASR_MODEL = 'iic/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch'
+# int8 dynamic quantization on CPU (set ASR_QUANTIZE_CPU=0 in .env to keep FP32)
+ASR_QUANTIZE_CPU = os.getenv("ASR_QUANTIZE_CPU", "1") != "0"
+# torch.compile of the encoder/decoder on GPU (set ASR_COMPILE=0 in .env to disable)
+ASR_COMPILE = os.getenv("ASR_COMPILE", "1") != "0"
+ASR_COMPILE_SUBMODULES = ("encoder", "decoder")
+SAMPLE_RATE = 16000
+
+def find_asr_module(asr_pipeline):
+    """
+    Locate the torch nn.Module wrapped by a ModelScope pipeline.
+
+    Args:
+        asr_pipeline: ModelScope ASR pipeline
+
+    Returns:
+        tuple: (owner, attribute name) holding the nn.Module, or (None, None) if not found
+    """
+    owner = asr_pipeline
+    for _ in range(3):
+        inner = getattr(owner, 'model', None)
+        if inner is None:
+            break
+        if isinstance(inner, torch.nn.Module):
+            return owner, 'model'
+        owner = inner
+    return None, None
+
+def quantize_asr_model(asr_pipeline):
+    """
+    Apply int8 dynamic quantization to the Linear/LSTM layers of the ASR model.
+    CPU inference is memory-bandwidth bound, so int8 weights roughly halve latency.
+
+    Args:
+        asr_pipeline: ModelScope ASR pipeline (modified in place)
+    """
+    owner, attr = find_asr_module(asr_pipeline)
+    if owner is None:
+        print("⚠️  Could not find the torch model inside the ASR pipeline, skipping int8 quantization")
+        return
+    quantized = torch.ao.quantization.quantize_dynamic(
+        getattr(owner, attr),
+        {torch.nn.Linear, torch.nn.LSTM},
+        dtype=torch.qint8
+    )
+    # quantize_dynamic silently returns a copy if no layer matched
+    swapped = sum(
+        isinstance(module, (torch.ao.nn.quantized.dynamic.Linear, torch.ao.nn.quantized.dynamic.LSTM))
+        for module in quantized.modules()
+    )
+    if swapped == 0:
+        print("⚠️  No Linear/LSTM layers found in the ASR model, skipping int8 quantization")
+        return
+    setattr(owner, attr, quantized)
+    print(f"✅ ASR model quantized to int8 (CPU, {swapped} layers)")
+
+def compile_asr_model(asr_pipeline, device):
+    """
+    Compile the Paraformer encoder and decoder with torch.compile and warm them
+    up on 1s of silence, so compilation happens before the first user request.
+
+    FunASR drives the model through model.inference(), which calls these
+    submodules via __call__; compiling the wrapper would only cover its unused
+    forward(). dynamic=True avoids a recompile for every new chunk length.
+    Falls back to eager mode if compilation fails.
+
+    Args:
+        asr_pipeline: ModelScope ASR pipeline (modified in place)
+        device (str): Device the model runs on
+    """
+    owner, attr = find_asr_module(asr_pipeline)
+    if owner is None:
+        print("⚠️  Could not find the torch model inside the ASR pipeline, skipping torch.compile")
+        return
+    model = getattr(owner, attr)
+    eager = {
+        name: getattr(model, name)
+        for name in ASR_COMPILE_SUBMODULES
+        if isinstance(getattr(model, name, None), torch.nn.Module)
+    }
+    if not eager:
+        print("⚠️  No encoder/decoder found in the ASR model, skipping torch.compile")
+        return
+    for name, module in eager.items():
+        setattr(model, name, torch.compile(module, dynamic=True))
+    try:
+        print(f"Compiling ASR {'/'.join(eager)} (warm-up on 1s of silence)...")
+        with torch.inference_mode(), asr_precision_context(device):
+            asr_pipeline(np.zeros(SAMPLE_RATE, dtype=np.float32))
+        print(f"✅ ASR {'/'.join(eager)} compiled")
+    except Exception as e:
+        for name, module in eager.items():
+            setattr(model, name, module)
+        print(f"⚠️  torch.compile failed ({str(e)}), using eager model")
+
+@functools.lru_cache(maxsize=1)
+def get_asr_pipeline(device=DEVICE):
+    """
+    Build the ModelScope Paraformer pipeline once and reuse it across requests.
+
+    Loading the model weights dominates per-request latency, so the pipeline is
+    cached for the lifetime of the process (lru_cache is thread-safe for Gradio).
+    On CPU the model is quantized to int8 once at load time; on GPU its
+    encoder and decoder are compiled with torch.compile and warmed up.
+
+    Args:
+        device (str): Device to load the model on ('cuda:0' or 'cpu')
+
+    Returns:
+        Pipeline: ModelScope ASR pipeline
+    """
+    print(f"Loading ASR model on device: {device}")
+    asr_pipeline = pipeline(
+        task='auto-speech-recognition',
+        model=ASR_MODEL,
+        device=device
+    )
+    # GPU uses FP16 autocast instead (see asr_precision_context)
+    if device == 'cpu' and ASR_QUANTIZE_CPU:
+        quantize_asr_model(asr_pipeline)
+    # Fused kernels cut per-op launch overhead in the encoder/decoder on GPU
+    if device.startswith('cuda') and ASR_COMPILE:
+        compile_asr_model(asr_pipeline, device)
+    return asr_pipeline
+
+def default_asr_batch_size(device=DEVICE):
+    """
+    Pick an ASR batch size that fits the available VRAM (~1 item per 1.5 GB, max 16).
+
+    Args:
+        device (str): Device the model runs on
+
+    Returns:
+        int: Number of audio inputs per Paraformer forward pass
+    """
+    if not device.startswith('cuda'):
+        return 4
+    vram_gb = torch.cuda.get_device_properties(0).total_memory / 1024 ** 3
+    return max(1, min(16, int(vram_gb // 1.5)))
+
+# Override with ASR_BATCH_SIZE in .env if needed
+ASR_BATCH_SIZE = int(os.getenv("ASR_BATCH_SIZE", default_asr_batch_size()))
+
+# Bulk-mode requests run in their own Gradio event, so model calls are serialized here
+asr_lock = threading.Lock()
+
+def asr_precision_context(device=DEVICE):
+    """
+    Mixed-precision context for ASR inference: FP16 autocast on CUDA, no-op on CPU.
+
+    Args:
+        device (str): Device the model runs on
+
+    Returns:
+        ContextManager: Autocast context (or nullcontext on CPU)
+    """
+    if device.startswith('cuda'):
+        return torch.autocast('cuda', dtype=torch.float16)
+    return contextlib.nullcontext()
+
 # ========================================
 # Initialize OpenAI client with DashScope base URL
 # ========================================
+DASHSCOPE_BASE_URL = "https://dashscope-intl.aliyuncs.com/compatible-mode/v1"
+
+# Shared HTTP/2 connection pool: concurrent requests are multiplexed over
+# kept-alive connections instead of paying a TLS handshake each time
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+# Fail fast on connect/pool waits, but give non-streaming completions
+# (packed texts, 2048-token retries) time to finish before the first byte
+HTTP_TIMEOUT = httpx.Timeout(60, read=300)
+
 client = OpenAI(
     api_key=DASHSCOPE_API_KEY,
-    base_url="https://dashscope-intl.aliyuncs.com/compatible-mode/v1"
+    base_url=DASHSCOPE_BASE_URL,
+    http_client=httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
 )
 
+# Async client for concurrent chunk translation. It runs on one background
+# event loop shared by all Gradio worker threads.
+aclient = AsyncOpenAI(
+    api_key=DASHSCOPE_API_KEY,
+    base_url=DASHSCOPE_BASE_URL,
+    http_client=httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+)
+translation_loop = asyncio.new_event_loop()
+threading.Thread(target=translation_loop.run_forever, name="translation-loop", daemon=True).start()
+
+# Long transcripts are split into chunks of at most this many characters
+TRANSLATION_CHUNK_CHARS = 1500
+# Max in-flight translation requests (override with TRANSLATION_MAX_CONCURRENCY in .env)
+MAX_CONCURRENCY = int(os.getenv("TRANSLATION_MAX_CONCURRENCY", 4))
+translation_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+# Translation settings (also part of the translation cache key)
+TRANSLATION_MODEL = "qwen-plus"  # Options: qwen-turbo, qwen-plus, qwen-max
+TRANSLATION_TEMPERATURE = 0.7
+TRANSLATION_TOP_P = 0.9
+
+# Persistent on-disk cache: identical transcripts skip the API call entirely
+translation_cache = diskcache.Cache("./.trans_cache")
+
+# Persistent on-disk cache: re-uploaded audio (same bytes) skips decoding and ASR
+asr_cache = diskcache.Cache("./.asr_cache")
+
 # ========================================
-# Step 1: Convert Audio to WAV (16kHz, mono)
+# Step 1: Decode Audio (16kHz, mono, float32)
 # ========================================
-def convert_audio_to_wav(audio_path, wav_path):
+def read_wav_f32(audio_path, sr=SAMPLE_RATE):
     """
-    Convert audio file to WAV format (16kHz, mono) for ASR processing.
-    If input is already WAV, skip conversion and just ensure proper format.
+    Read a WAV file in-process with libsndfile (no ffmpeg/ffprobe subprocess).
+    Multi-channel audio is downmixed and other sample rates are resampled.
+
+    Args:
+        audio_path (str): Path to WAV file
+        sr (int): Target sample rate
+
+    Returns:
+        np.ndarray: Mono float32 waveform in [-1, 1]
+    """
+    data, file_sr = sf.read(audio_path, dtype='float32', always_2d=True)
+    waveform = data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+    if file_sr != sr:
+        g = math.gcd(sr, file_sr)
+        waveform = resample_poly(waveform, sr // g, file_sr // g).astype(np.float32)
+    return np.ascontiguousarray(waveform)
+
+def decode_audio_to_f32(audio_path, sr=SAMPLE_RATE):
+    """
+    Decode any audio file to a mono float32 waveform with one ffmpeg subprocess.
+    PCM is read straight from ffmpeg's stdout, so nothing is written to disk.
+
+    Args:
+        audio_path (str): Path to input audio file
+        sr (int): Target sample rate
+
+    Returns:
+        np.ndarray: Mono float32 waveform in [-1, 1]
+    """
+    cmd = [FFMPEG_PATH, "-v", "error", "-nostdin", "-i", audio_path,
+           "-ar", str(sr), "-ac", "1", "-f", "f32le", "pipe:1"]
+    proc = subprocess.run(cmd, capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", errors="ignore").strip())
+    return np.frombuffer(proc.stdout, dtype=np.float32)
+
+def load_audio_for_asr(audio_path):
+    """
+    Load an audio file as a 16kHz mono float32 waveform for ASR processing.
+    WAV files are read in-process with soundfile; other formats use a single
+    ffmpeg decode, falling back to pydub if ffmpeg is missing.
 
     Args:
         audio_path (str): Path to input audio file (MP3, WAV, etc.)
-        wav_path (str): Path to output WAV file
 
     Returns:
-        str: Path to WAV file (original or converted)
+        np.ndarray: Mono float32 waveform at SAMPLE_RATE
     """
     try:
-        # Check if file is already in WAV format
+        # Fast path: WAV is decoded in-process, no subprocess at all
         if audio_path.lower().endswith('.wav'):
-            print(f"✅ File is already WAV format: {audio_path}")
-            # Still load and ensure correct format (16kHz, mono)
-            audio = AudioSegment.from_wav(audio_path)
-            audio = audio.set_frame_rate(16000).set_channels(1)
-            audio.export(wav_path, format="wav")
-            print(f"✅ Ensured correct format (16kHz, mono): {wav_path}")
-            return wav_path
-        else:
-            # Convert from other formats (MP3, etc.)
-            audio = AudioSegment.from_file(audio_path)
-            audio = audio.set_frame_rate(16000).set_channels(1)
-            audio.export(wav_path, format="wav")
-            print(f"✅ Converted {audio_path} to {wav_path}")
-            return wav_path
+            try:
+                waveform = read_wav_f32(audio_path)
+                print(f"✅ Read WAV in-process (16kHz, mono): {audio_path}")
+                return waveform
+            except RuntimeError:
+                pass  # WAV codec libsndfile can't read: let ffmpeg handle it
+
+        if FFMPEG_PATH:
+            # Single ffmpeg pass: decode + resample + downmix straight to memory
+            waveform = decode_audio_to_f32(audio_path)
+            print(f"✅ Decoded {audio_path} (16kHz, mono)")
+            return waveform
+
+        # Fallback: pydub (slower, decodes through Python)
+        audio = AudioSegment.from_file(audio_path)
+        audio = audio.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+        pcm = np.array(audio.get_array_of_samples(), dtype=np.int16)
+        print(f"✅ Decoded {audio_path} with pydub (16kHz, mono)")
+        return pcm.astype(np.float32) / 32768.0
     except Exception as e:
         raise RuntimeError(f"Failed to convert audio: {str(e)}")
 
@@ -81,28 +348,75 @@ def convert_audio_to_wav(audio_path, wav_path):
 # ========================================
 # Step 2: Transcribe Chinese Speech → Text
 # ========================================
-def transcribe_audio(wav_path):
+ASR_CHUNK_SECONDS = 30           # Long audio is split into windows of this length
+ASR_CHUNK_OVERLAP_SECONDS = 0.5  # Overlap so words on a boundary are not cut
+ASR_MIN_TAIL_SECONDS = 1         # Shorter final chunks are merged into the previous one
+NO_SPEECH_TEXT = "(No speech detected or transcription failed.)"
+
+def split_audio_for_asr(waveform, chunk_seconds=ASR_CHUNK_SECONDS,
+                        overlap_seconds=ASR_CHUNK_OVERLAP_SECONDS,
+                        min_tail_seconds=ASR_MIN_TAIL_SECONDS):
     """
-    Transcribe Chinese audio to text using ModelScope Paraformer.
+    Split a long 16kHz mono waveform into overlapping chunks for batched ASR.
+    Short waveforms are returned as a single chunk.
 
     Args:
-        wav_path (str): Path to WAV audio file
+        waveform (np.ndarray): Mono float32 waveform at SAMPLE_RATE
+        chunk_seconds (float): Chunk length in seconds
+        overlap_seconds (float): Overlap between consecutive chunks in seconds
+        min_tail_seconds (float): Final chunks shorter than this extend the previous chunk
 
     Returns:
-        str: Transcribed Chinese text
+        list[np.ndarray]: ASR inputs
     """
-    import torch  # Import here to avoid issues if not needed
+    chunk_frames = int(chunk_seconds * SAMPLE_RATE)
+    overlap_frames = int(overlap_seconds * SAMPLE_RATE)
+    if len(waveform) <= chunk_frames:
+        return [waveform]
 
-    device = 'gpu' if torch.cuda.is_available() else 'cpu'
-    print(f"Using device: {device}")
+    step = chunk_frames - overlap_frames
+    starts = list(range(0, len(waveform) - overlap_frames, step))
+    # A short tail is mostly already-transcribed overlap and decodes to a
+    # stray duplicated character, so the previous chunk runs to the end instead
+    if len(waveform) - starts[-1] < int(min_tail_seconds * SAMPLE_RATE):
+        starts.pop()
+    ends = [start + chunk_frames for start in starts[:-1]] + [len(waveform)]
+    return [waveform[start:end] for start, end in zip(starts, ends)]
 
-    asr_pipeline = pipeline(
-        task='auto-speech-recognition',
-        model='iic/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch',
-        device=device
-    )
-    result = asr_pipeline(wav_path)
+def stitch_transcripts(texts, max_overlap_chars=16, min_overlap_chars=2):
+    """
+    Join chunk transcripts, dropping text repeated across the chunk overlap.
+    Single-character matches are ignored: common characters (的/是/了) often
+    match by coincidence at a seam and real text would be dropped.
+
+    Args:
+        texts (list[str]): Transcripts of consecutive chunks
+        max_overlap_chars (int): Longest suffix/prefix duplicate to look for
+        min_overlap_chars (int): Shortest suffix/prefix duplicate treated as overlap
+
+    Returns:
+        str: Stitched transcript
+    """
+    stitched = ""
+    for text in texts:
+        overlap = 0
+        for k in range(min(max_overlap_chars, len(stitched), len(text)), min_overlap_chars - 1, -1):
+            if stitched.endswith(text[:k]):
+                overlap = k
+                break
+        stitched += text[overlap:]
+    return stitched
+
+def extract_asr_text(result):
+    """
+    Pull the transcript out of a single ASR result.
+
+    Args:
+        result: Pipeline output for one audio input (list of segments, dict, or other)
 
+    Returns:
+        str: Transcribed Chinese text (may be empty)
+    """
     # Handle both list and dict output formats
     if isinstance(result, list):
         chinese_text = "".join([seg["text"] for seg in result])
@@ -111,64 +425,747 @@ def transcribe_audio(wav_path):
     else:
         chinese_text = str(result)  # Fallback
 
-    chinese_text = chinese_text.strip()
-    if not chinese_text:
-        chinese_text = "(No speech detected or transcription failed.)"
+    return chinese_text.strip()
+
+def run_asr(asr_inputs, batch_size):
+    """
+    Run the Paraformer pipeline on a list of in-memory waveforms.
+
+    Args:
+        asr_inputs (list[np.ndarray]): ASR inputs
+        batch_size (int): Inputs per forward pass
+
+    Returns:
+        list: One pipeline result per input
+    """
+    asr_pipeline = get_asr_pipeline(DEVICE)
+    # No autograd bookkeeping; FP16 tensor cores on GPU
+    with asr_lock, torch.inference_mode(), asr_precision_context(DEVICE):
+        if len(asr_inputs) == 1:
+            return [asr_pipeline(asr_inputs[0])]
+        return asr_pipeline(asr_inputs, batch_size=batch_size)
+
+def transcribe_audio_batch(waveforms, batch_size=None):
+    """
+    Transcribe several Chinese audio waveforms with batched Paraformer forward passes.
+    Long audio is split into ~30s chunks that share the same batches.
+
+    Args:
+        waveforms (list[np.ndarray]): Mono float32 waveforms at SAMPLE_RATE
+        batch_size (int, optional): Inputs per forward pass (default: ASR_BATCH_SIZE)
+
+    Returns:
+        list[str]: Transcribed Chinese text, one entry per waveform
+    """
+    batch_size = batch_size or ASR_BATCH_SIZE
+    print(f"Using device: {DEVICE} (batch size: {batch_size})")
+
+    # Flatten all chunks of all files into one input list, remembering the owner file
+    asr_inputs = []
+    owners = []
+    for index, waveform in enumerate(waveforms):
+        chunks = split_audio_for_asr(waveform)
+        if len(chunks) > 1:
+            print(f"✂️  Split audio into {len(chunks)} chunks of {ASR_CHUNK_SECONDS}s")
+        asr_inputs.extend(chunks)
+        owners.extend([index] * len(chunks))
+
+    results = run_asr(asr_inputs, batch_size)
+
+    chunk_texts = [[] for _ in waveforms]
+    for owner, result in zip(owners, results):
+        chunk_texts[owner].append(extract_asr_text(result))
+
+    chinese_texts = []
+    for texts in chunk_texts:
+        chinese_text = stitch_transcripts(texts) or NO_SPEECH_TEXT
+        print(f"✅ Chinese Transcript: {chinese_text}")
+        chinese_texts.append(chinese_text)
+    return chinese_texts
+
+def spans_several_asr_batches(waveform, batch_size=None):
+    """
+    Check whether a waveform needs more than one ASR forward pass.
+    Only then can translation of early chunks overlap with ASR of later ones.
+
+    Args:
+        waveform (np.ndarray): Mono float32 waveform at SAMPLE_RATE
+        batch_size (int, optional): Chunks per forward pass (default: ASR_BATCH_SIZE)
+
+    Returns:
+        bool: True if the audio splits into more chunks than one batch holds
+    """
+    return len(split_audio_for_asr(waveform)) > (batch_size or ASR_BATCH_SIZE)
+
+def iter_transcribe_segments(waveform, batch_size=None):
+    """
+    Transcribe long audio one ASR batch at a time, yielding the text of each chunk.
+
+    Args:
+        waveform (np.ndarray): Mono float32 waveform at SAMPLE_RATE
+        batch_size (int, optional): Chunks per forward pass (default: ASR_BATCH_SIZE)
+
+    Yields:
+        str: Transcript of the next chunk (overlap with earlier text removed)
+    """
+    batch_size = batch_size or ASR_BATCH_SIZE
+    chunks = split_audio_for_asr(waveform)
+    print(f"✂️  Split audio into {len(chunks)} chunks of {ASR_CHUNK_SECONDS}s")
+    chunk_texts = []
+    stitched = ""
+    for start in range(0, len(chunks), batch_size):
+        results = run_asr(chunks[start:start + batch_size], batch_size)
+        for result in results:
+            chunk_texts.append(extract_asr_text(result))
+            # Stitching only trims the start of later chunks, so earlier text never changes
+            new_stitched = stitch_transcripts(chunk_texts)
+            yield new_stitched[len(stitched):]
+            stitched = new_stitched
+
+def transcribe_audio(waveform):
+    """
+    Transcribe Chinese audio to text using ModelScope Paraformer.
+
+    Args:
+        waveform (np.ndarray): Mono float32 waveform at SAMPLE_RATE
+
+    Returns:
+        str: Transcribed Chinese text
+    """
+    return transcribe_audio_batch([waveform])[0]
+
+def audio_cache_key(audio_path):
+    """
+    Build the transcript cache key from the raw audio bytes and ASR settings
+    (model, chunking, device and CPU quantization all change the output).
+
+    Args:
+        audio_path (str): Path to uploaded audio file
+
+    Returns:
+        str: BLAKE3 hex digest
+    """
+    hasher = blake3()
+    settings = f"{ASR_MODEL}|{ASR_CHUNK_SECONDS}|{ASR_CHUNK_OVERLAP_SECONDS}|{DEVICE}|{ASR_QUANTIZE_CPU}|"
+    hasher.update(settings.encode("utf-8"))
+    with open(audio_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
 
-    # print(f"✅ Chinese Transcript: {chinese_text[:100]}...")  # Old: limited to 100 chars
-    print(f"✅ Chinese Transcript: {chinese_text}")  # New: print full transcript
-    return chinese_text
+def store_transcript(audio_key, chinese_text):
+    """
+    Save a transcript in the ASR cache (the no-speech placeholder is not cached).
+
+    Args:
+        audio_key (str): Key from audio_cache_key
+        chinese_text (str): Transcribed Chinese text
+    """
+    if chinese_text != NO_SPEECH_TEXT:
+        asr_cache.set(audio_key, chinese_text)
 
 # ========================================
 # Step 3: Translate Chinese → English using OpenAI Wrapper
 # ========================================
-def translate_chinese_to_english_openai(chinese_text):
+def translation_cache_key(chinese_text):
     """
-    Translate Chinese text to English using Qwen model via OpenAI-compatible API.
+    Build the translation cache key from the transcript and generation settings.
 
     Args:
         chinese_text (str): Chinese text to translate
 
     Returns:
-        str: English translation
+        str: SHA-256 hex digest
+    """
+    raw = f"{TRANSLATION_MODEL}|{TRANSLATION_TEMPERATURE}|{TRANSLATION_TOP_P}|{chinese_text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# Hard cap on max_tokens; truncated translations are retried once at this cap
+TRANSLATION_MAX_TOKENS = 2048
+# Open-weight tokenizer from the same family as the API model, used to size max_tokens
+TRANSLATION_TOKENIZER = "Qwen/Qwen2.5-7B-Instruct"
+
+@functools.lru_cache(maxsize=1)
+def get_translation_tokenizer():
+    """
+    Load the Qwen tokenizer once (downloaded from the Hugging Face Hub).
+    Called at startup so the download never blocks a translation request.
+
+    Returns:
+        Tokenizer: Qwen tokenizer, or None if it could not be loaded
+    """
+    try:
+        return Tokenizer.from_pretrained(TRANSLATION_TOKENIZER)
+    except Exception as e:
+        print(f"⚠️  Could not load tokenizer {TRANSLATION_TOKENIZER} ({str(e)}), estimating tokens from length")
+        return None
+
+def estimate_max_tokens(chinese_text):
+    """
+    Estimate the max_tokens budget for translating a piece of Chinese text.
+    Based on the real Qwen token count of the input, so the server does not
+    reserve far more KV cache than the translation needs.
+
+    Args:
+        chinese_text (str): Chinese text to translate
+
+    Returns:
+        int: max_tokens for the completion request
+    """
+    tokenizer = get_translation_tokenizer()
+    if tokenizer is not None:
+        input_tokens = len(tokenizer.encode(chinese_text).ids)
+    else:
+        input_tokens = len(chinese_text)  # CJK is at most ~1 token per char in Qwen
+    # English output runs ~1.2-1.5x the Chinese token count, plus headroom for short texts
+    return min(int(input_tokens * 1.5) + 64, TRANSLATION_MAX_TOKENS)  # Cap at safe limit
+
+def build_translation_messages(chinese_text):
+    """
+    Build the chat messages for a translation request.
+
+    Args:
+        chinese_text (str): Chinese text to translate
+
+    Returns:
+        list[dict]: Messages for chat.completions.create
+    """
+    return [
+        {
+            "role": "user",
+            "content": f"Translate the following Chinese text into fluent, natural English. Be complete and do not summarize:\n\n{chinese_text}"
+        }
+    ]
+
+def split_chinese_text(chinese_text, max_chars=TRANSLATION_CHUNK_CHARS):
+    """
+    Split a transcript into chunks of at most max_chars, preferring sentence boundaries.
+
+    Args:
+        chinese_text (str): Chinese text to split
+        max_chars (int): Maximum characters per chunk
+
+    Returns:
+        list[str]: Chunks in original order
+    """
+    sentences = re.split(r'(?<=[。！？；!?;\n])', chinese_text)
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        if current and len(current) + len(sentence) > max_chars:
+            chunks.append(current)
+            current = ""
+        # Hard-split sentences that are longer than a whole chunk (e.g. unpunctuated ASR output)
+        while len(sentence) > max_chars:
+            chunks.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        current += sentence
+    chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+async def translate_chunk_async(chinese_text, max_tokens):
     """
+    Translate one chunk with the async client, limited by MAX_CONCURRENCY.
+    A reply cut off by max_tokens is retried once at TRANSLATION_MAX_TOKENS.
+
+    Args:
+        chinese_text (str): Chinese text chunk
+        max_tokens (int): Initial max_tokens (computed by the caller, off the event loop)
+
+    Returns:
+        tuple: (English translation of the chunk, False if it is still truncated)
+    """
+    while True:
+        async with translation_semaphore:
+            completion = await aclient.chat.completions.create(
+                model=TRANSLATION_MODEL,
+                messages=build_translation_messages(chinese_text),
+                temperature=TRANSLATION_TEMPERATURE,
+                top_p=TRANSLATION_TOP_P,
+                max_tokens=max_tokens
+            )
+        choice = completion.choices[0]
+        complete = choice.finish_reason != "length"
+        if complete or max_tokens >= TRANSLATION_MAX_TOKENS:
+            return choice.message.content.strip(), complete
+        print(f"⚠️  Chunk translation truncated at {max_tokens} tokens, retrying with {TRANSLATION_MAX_TOKENS}")
+        max_tokens = TRANSLATION_MAX_TOKENS
+
+def stream_translate_chunks_concurrently(chunks):
+    """
+    Translate chunks concurrently and yield the in-order prefix as it completes.
+
+    All requests are dispatched at once on the background event loop; results
+    are joined in the original order.
+
+    Args:
+        chunks (list[str]): Chinese text chunks
+
+    Yields:
+        str: English translation of the completed leading chunks
+
+    Returns:
+        tuple: (full translation, False if any chunk was truncated)
+    """
+    print(f"Translating {len(chunks)} chunks concurrently (max {MAX_CONCURRENCY} in flight)...")
+    futures = [
+        asyncio.run_coroutine_threadsafe(
+            translate_chunk_async(chunk, estimate_max_tokens(chunk)), translation_loop
+        )
+        for chunk in chunks
+    ]
     try:
-        # Estimate required output length
-        estimated_output_tokens = max(512, int(len(chinese_text) * 1.3))
-        actual_max = min(estimated_output_tokens, 2048)  # Cap at safe limit
+        parts = []
+        complete = True
+        for future in futures:
+            part, part_complete = future.result()
+            parts.append(part)
+            complete = complete and part_complete
+            yield "\n\n".join(parts)
+    finally:
+        for future in futures:
+            future.cancel()
+    print(f"✅ Translation complete ({len(chunks)} chunks)")
+    return "\n\n".join(parts), complete
 
+def stream_translate_single(chinese_text):
+    """
+    Stream the translation of one piece of text in a single request.
+    A reply cut off by max_tokens is retried once at TRANSLATION_MAX_TOKENS.
+
+    Args:
+        chinese_text (str): Chinese text to translate
+
+    Yields:
+        str: English translation received so far
+
+    Returns:
+        tuple: (full translation, False if it is still truncated)
+    """
+    actual_max = estimate_max_tokens(chinese_text)
+    while True:
         print(f"Translating {len(chinese_text)} chars (max_tokens: {actual_max})...")
 
-        # Call Qwen model using OpenAI-compatible interface
+        # Call Qwen model using OpenAI-compatible interface (streamed)
         completion = client.chat.completions.create(
-            model="qwen-plus",  # Options: qwen-turbo, qwen-plus, qwen-max
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"Translate the following Chinese text into fluent, natural English. Be complete and do not summarize:\n\n{chinese_text}"
-                }
-            ],
-            temperature=0.7,
-            top_p=0.9,
-            max_tokens=actual_max
+            model=TRANSLATION_MODEL,
+            messages=build_translation_messages(chinese_text),
+            temperature=TRANSLATION_TEMPERATURE,
+            top_p=TRANSLATION_TOP_P,
+            max_tokens=actual_max,
+            stream=True,
+            stream_options={"include_usage": True}
         )
 
-        # Extract translated text
-        translated = completion.choices[0].message.content.strip()
+        # Accumulate tokens as they arrive
+        translated = ""
+        usage = None
+        finish_reason = None
+        for chunk in completion:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            delta = chunk.choices[0].delta.content or ""
+            if delta:
+                translated += delta
+                yield translated
 
         # Display token usage info
-        if completion.usage:
+        if usage:
             print(f"✅ Translation complete:")
-            print(f"   - Prompt tokens: {completion.usage.prompt_tokens}")
-            print(f"   - Completion tokens: {completion.usage.completion_tokens}")
-            print(f"   - Total tokens: {completion.usage.total_tokens}")
+            print(f"   - Prompt tokens: {usage.prompt_tokens}")
+            print(f"   - Completion tokens: {usage.completion_tokens}")
+            print(f"   - Total tokens: {usage.total_tokens}")
+
+        complete = finish_reason != "length"
+        if complete or actual_max >= TRANSLATION_MAX_TOKENS:
+            translated = translated.strip()
+            yield translated
+            return translated, complete
+        print(f"⚠️  Translation truncated at {actual_max} tokens, retrying with {TRANSLATION_MAX_TOKENS}")
+        actual_max = TRANSLATION_MAX_TOKENS
+
+def stream_translate_chinese_to_english_openai(chinese_text):
+    """
+    Stream a Chinese → English translation from Qwen via OpenAI-compatible API.
+    Long transcripts are split into chunks that are translated concurrently.
+    Complete results are cached on disk by SHA-256 of the transcript and model
+    settings; truncated or failed translations are not cached.
+
+    Args:
+        chinese_text (str): Chinese text to translate
+
+    Yields:
+        str: English translation received so far (the last value is the full translation)
+
+    Returns:
+        tuple: (translation, True if it is complete and was cached or came from the cache)
+    """
+    try:
+        cache_key = translation_cache_key(chinese_text)
+        cached = translation_cache.get(cache_key)
+        if cached is not None:
+            print(f"✅ Translation cache hit ({len(chinese_text)} chars)")
+            yield cached
+            return cached, True
+
+        chunks = split_chinese_text(chinese_text)
+        if len(chunks) > 1:
+            partials = stream_translate_chunks_concurrently(chunks)
+        else:
+            partials = stream_translate_single(chinese_text)
+
+        translated, complete = yield from partials
+
+        # Only complete translations are cached
+        if complete:
+            translation_cache.set(cache_key, translated)
+        else:
+            print("⚠️  Translation hit the max_tokens cap and may be incomplete, not caching it")
+        return translated, complete
+
+    except Exception as e:
+        error_msg = f"Translation failed: {str(e)}"
+        print(f"❌ {error_msg}")
+        yield error_msg
+        return error_msg, False
+
+def translate_chinese_to_english_with_status(chinese_text):
+    """
+    Translate Chinese text to English and report whether the result is complete.
+
+    Args:
+        chinese_text (str): Chinese text to translate
+
+    Returns:
+        tuple: (English translation, False if it failed or was truncated)
+    """
+    partials = stream_translate_chinese_to_english_openai(chinese_text)
+    while True:
+        try:
+            next(partials)
+        except StopIteration as stop:
+            return stop.value
+
+def translate_chinese_to_english_openai(chinese_text):
+    """
+    Translate Chinese text to English using Qwen model via OpenAI-compatible API.
+
+    Args:
+        chinese_text (str): Chinese text to translate
+
+    Returns:
+        str: English translation
+    """
+    return translate_chinese_to_english_with_status(chinese_text)[0]
+
+# Separator used when several texts are packed into one translation request
+PACK_SEPARATOR = "%%"
+
+def pack_texts(texts, max_chars=TRANSLATION_CHUNK_CHARS):
+    """
+    Greedily group consecutive texts so each group stays under max_chars.
+
+    Args:
+        texts (list[str]): Texts to group
+        max_chars (int): Maximum combined characters per group
+
+    Returns:
+        list[list[int]]: Groups of indices into texts, in order
+    """
+    groups = []
+    current = []
+    current_chars = 0
+    for index, text in enumerate(texts):
+        if current and current_chars + len(text) > max_chars:
+            groups.append(current)
+            current = []
+            current_chars = 0
+        current.append(index)
+        current_chars += len(text)
+    if current:
+        groups.append(current)
+    return groups
+
+def translate_packed_texts(chinese_texts):
+    """
+    Translate several short texts in one request, separated by PACK_SEPARATOR.
+
+    Args:
+        chinese_texts (list[str]): Chinese texts to translate together
+
+    Returns:
+        list[str]: English translations in the same order
+
+    Raises:
+        ValueError: If the reply was truncated or did not contain one translation per input
+    """
+    content = (
+        "Translate each of the following Chinese paragraphs into fluent, natural English. "
+        "Be complete and do not summarize. "
+        f"Separate the results with a line containing only '{PACK_SEPARATOR}' and preserve the order.\n\n"
+        + f"\n{PACK_SEPARATOR}\n".join(chinese_texts)
+    )
+    print(f"Translating {len(chinese_texts)} texts in one packed request...")
+    completion = client.chat.completions.create(
+        model=TRANSLATION_MODEL,
+        messages=[{"role": "user", "content": content}],
+        temperature=TRANSLATION_TEMPERATURE,
+        top_p=TRANSLATION_TOP_P,
+        max_tokens=estimate_max_tokens("".join(chinese_texts))
+    )
+    if completion.choices[0].finish_reason == "length":
+        raise ValueError("packed translation was truncated by max_tokens")
+    translated = completion.choices[0].message.content
+    englishes = [part.strip() for part in translated.split(PACK_SEPARATOR)]
+    if len(englishes) != len(chinese_texts):
+        raise ValueError(f"expected {len(chinese_texts)} translations, got {len(englishes)}")
+    return englishes
+
+def translate_batch_chinese_to_english_openai(chinese_texts):
+    """
+    Translate several transcripts, packing short ones into shared requests.
+    Cached texts are returned directly; long texts use the regular (chunked) path.
+
+    Args:
+        chinese_texts (list[str]): Chinese texts to translate
+
+    Returns:
+        list[str]: English translations in the same order
+    """
+    translations = [None] * len(chinese_texts)
+    pending = []
+    for index, chinese_text in enumerate(chinese_texts):
+        cached = translation_cache.get(translation_cache_key(chinese_text))
+        if cached is not None:
+            translations[index] = cached
+        elif len(chinese_text) <= TRANSLATION_CHUNK_CHARS:
+            pending.append(index)
+        else:
+            translations[index] = translate_chinese_to_english_openai(chinese_text)
+
+    for group in pack_texts([chinese_texts[i] for i in pending]):
+        indices = [pending[i] for i in group]
+        texts = [chinese_texts[i] for i in indices]
+        if len(texts) > 1:
+            try:
+                englishes = translate_packed_texts(texts)
+                for index, chinese_text, english in zip(indices, texts, englishes):
+                    translations[index] = english
+                    translation_cache.set(translation_cache_key(chinese_text), english)
+                continue
+            except Exception as e:
+                print(f"⚠️  Packed translation failed ({str(e)}), retrying per text")
+        for index, chinese_text in zip(indices, texts):
+            translations[index] = translate_chinese_to_english_openai(chinese_text)
+
+    print(f"✅ Translated {len(chinese_texts)} texts")
+    return translations
+
+# Seconds between Batch API status checks in bulk mode
+BATCH_POLL_SECONDS = 10
+# Longest a Gradio worker waits on a batch before returning (override with BATCH_MAX_WAIT_SECONDS in .env)
+BATCH_MAX_WAIT_SECONDS = int(os.getenv("BATCH_MAX_WAIT_SECONDS", 30 * 60))
+# Parallel bulk-mode requests in Gradio (override with BULK_CONCURRENCY_LIMIT in .env)
+BULK_CONCURRENCY_LIMIT = int(os.getenv("BULK_CONCURRENCY_LIMIT", 4))
+# Unfinished batches are remembered for their 24h completion window (+1h slack)
+BATCH_RECORD_SECONDS = 25 * 60 * 60
+BATCH_FINAL_STATES = ("completed", "failed", "expired", "cancelled")
+# Translations still waiting on a batch start with this marker (kept out of reports)
+BATCH_PENDING_PREFIX = "⏳ Batch"
+
+def batch_record_key(chinese_text):
+    """
+    Build the cache key that remembers which submitted batch translates a transcript.
+
+    Args:
+        chinese_text (str): Chinese text sent to the Batch API
+
+    Returns:
+        str: Key in translation_cache
+    """
+    return f"batch|{translation_cache_key(chinese_text)}"
+
+def submit_translation_batch(chinese_texts, indices):
+    """
+    Upload one JSONL request per transcript and start a 24h Batch API job.
+    Each transcript is recorded with its batch id, so a later bulk request
+    collects the results of this batch instead of paying for them again.
+
+    Args:
+        chinese_texts (list[str]): All Chinese texts of the request
+        indices (list[int]): Positions of the texts to submit
+
+    Returns:
+        str: Batch id
+    """
+    lines = [
+        json.dumps({
+            "custom_id": f"request-{index}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": TRANSLATION_MODEL,
+                "messages": build_translation_messages(chinese_texts[index]),
+                "temperature": TRANSLATION_TEMPERATURE,
+                "top_p": TRANSLATION_TOP_P,
+                "max_tokens": estimate_max_tokens(chinese_texts[index])
+            }
+        }, ensure_ascii=False)
+        for index in indices
+    ]
+    batch_file = client.files.create(
+        file=("translations.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    for index in indices:
+        translation_cache.set(
+            batch_record_key(chinese_texts[index]),
+            (batch.id, f"request-{index}"),
+            expire=BATCH_RECORD_SECONDS
+        )
+    print(f"📦 Submitted batch {batch.id} ({len(indices)} requests)")
+    return batch.id
+
+def wait_for_batch(batch_id, deadline):
+    """
+    Poll a batch until it reaches a final state or the deadline passes.
+
+    Args:
+        batch_id (str): Batch id
+        deadline (float): time.monotonic() value to stop polling at
+
+    Returns:
+        Batch: Latest batch object (status may still be in progress)
+    """
+    batch = client.batches.retrieve(batch_id)
+    while batch.status not in BATCH_FINAL_STATES and time.monotonic() < deadline:
+        time.sleep(BATCH_POLL_SECONDS)
+        batch = client.batches.retrieve(batch_id)
+        print(f"   - Batch {batch_id} status: {batch.status}")
+    return batch
+
+def read_batch_results(batch):
+    """
+    Download a finished batch's output file.
+
+    Args:
+        batch: Batch object with an output_file_id
+
+    Returns:
+        dict: custom_id -> (translated text, finish_reason)
+    """
+    results = {}
+    output = client.files.content(batch.output_file_id).text
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        body = (record.get("response") or {}).get("body") or {}
+        choices = body.get("choices")
+        if not choices:
+            continue
+        results[record["custom_id"]] = (
+            choices[0]["message"]["content"].strip(),
+            choices[0].get("finish_reason")
+        )
+    return results
+
+def translate_with_batch_api(chinese_texts):
+    """
+    Translate transcripts through the OpenAI-compatible Batch API (bulk mode).
+    Batch jobs are slower to start but billed at a lower rate than chat calls.
+    Texts already submitted in an unfinished batch are collected from that
+    batch instead of being submitted again.
+
+    Args:
+        chinese_texts (list[str]): Chinese texts to translate
+
+    Returns:
+        list[str]: English translations in the same order (texts whose batch is
+            still running get a message starting with BATCH_PENDING_PREFIX)
+    """
+    translations = [None] * len(chinese_texts)
+    pending = []
+    jobs = {}  # batch id -> [(index, custom_id)]
+    for index, chinese_text in enumerate(chinese_texts):
+        cached = translation_cache.get(translation_cache_key(chinese_text))
+        if cached is not None:
+            translations[index] = cached
+            continue
+        record = translation_cache.get(batch_record_key(chinese_text))
+        if record is not None:
+            batch_id, custom_id = record
+            jobs.setdefault(batch_id, []).append((index, custom_id))
+        else:
+            pending.append(index)
+
+    if not pending and not jobs:
+        print("✅ Translation cache hit for all texts (bulk mode)")
+        return translations
+    if jobs:
+        print(f"📦 Collecting {len(jobs)} earlier batch(es) instead of resubmitting")
+
+    try:
+        if pending:
+            batch_id = submit_translation_batch(chinese_texts, pending)
+            jobs[batch_id] = [(index, f"request-{index}") for index in pending]
 
-        return translated
+        # Poll until every batch reaches a final state or the wait limit is hit
+        deadline = time.monotonic() + BATCH_MAX_WAIT_SECONDS
+        for batch_id, requests in jobs.items():
+            batch = wait_for_batch(batch_id, deadline)
+            if batch.status not in BATCH_FINAL_STATES:
+                still_running = (
+                    f"{BATCH_PENDING_PREFIX} {batch_id} still running (status: {batch.status}), "
+                    "click Bulk Mode again later to collect the results"
+                )
+                print(still_running)
+                for index, _ in requests:
+                    translations[index] = still_running
+                continue
+
+            # Expired/cancelled batches can still carry partial results
+            results = {}
+            if batch.output_file_id:
+                if batch.status != "completed":
+                    print(f"⚠️  Batch {batch_id} ended with status '{batch.status}', reading partial results")
+                results = read_batch_results(batch)
+            else:
+                print(f"⚠️  Batch {batch_id} ended with status '{batch.status}' and no output")
+
+            for index, custom_id in requests:
+                # The batch is finished: a later run resubmits anything still missing
+                translation_cache.delete(batch_record_key(chinese_texts[index]))
+                if custom_id not in results:
+                    continue
+                translated, finish_reason = results[custom_id]
+                translations[index] = translated
+                # Replies cut off by max_tokens are shown but not cached
+                if finish_reason != "length":
+                    translation_cache.set(translation_cache_key(chinese_texts[index]), translated)
+
+        print(f"✅ Batch translation finished ({len(jobs)} batch(es))")
 
     except Exception as e:
         error_msg = f"Translation failed: {str(e)}"
         print(f"❌ {error_msg}")
-        return error_msg
+        for index, translated in enumerate(translations):
+            if translated is None:
+                translations[index] = error_msg
+
+    # Requests that failed inside the batch
+    return [
+        translated if translated is not None else "Translation failed: no result returned by batch"
+        for translated in translations
+    ]
 
 # ========================================
 # Step 4: Generate Markdown (.md) File
@@ -185,98 +1182,249 @@ def generate_markdown_file(audio_filename, chinese_text, english_translation=Non
     Returns:
         str: Path to generated markdown file
     """
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    # Base content with Chinese transcript
-    md_content = f"""# Audio Transcription Report
+    now = datetime.datetime.now()
+    timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
 
-**Audio File**: `{audio_filename}`
-**Generated On**: {timestamp}
-**Model Used**:
-- ASR: `speech_paraformer-large` (ModelScope)
-"""
+    # Base content with Chinese transcript (fragments joined once at the end)
+    parts = [
+        "# Audio Transcription Report\n",
+        "\n",
+        f"**Audio File**: `{audio_filename}`\n",
+        f"**Generated On**: {timestamp}\n",
+        "**Model Used**:\n",
+        "- ASR: `speech_paraformer-large` (ModelScope)\n",
+    ]
 
     # Add translation info only if translation was performed
     if english_translation:
-        md_content += "- Translation: `qwen-plus` (DashScope API via OpenAI Wrapper)\n"
+        parts.append(f"- Translation: `{TRANSLATION_MODEL}` (DashScope API via OpenAI Wrapper)\n")
 
-    md_content += "\n---\n\n## 🇨🇳 Chinese Transcript\n"
-    md_content += f"{chinese_text}\n\n"
+    parts.extend(["\n---\n\n## 🇨🇳 Chinese Transcript\n", chinese_text, "\n\n"])
 
     # Add English translation section only if available
     if english_translation:
-        md_content += "---\n\n## 🇬🇧 English Translation\n"
-        md_content += f"{english_translation}\n\n"
+        parts.extend(["---\n\n## 🇬🇧 English Translation\n", english_translation, "\n\n"])
 
-    md_content += "---\n*Generated by Qwen + ModelScope Pipeline*\n"
+    parts.append("---\n*Generated by Qwen + ModelScope Pipeline*\n")
+    md_content = "".join(parts)
 
-    output_path = f"transcript_{int(datetime.datetime.now().timestamp())}.md"
-    with open(output_path, "w", encoding="utf-8") as f:
+    # Unique file in the local temp dir (no collisions between concurrent requests)
+    with tempfile.NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        prefix=f"transcript_{int(now.timestamp())}_",
+        suffix=".md",
+        dir=tempfile.gettempdir(),
+        delete=False
+    ) as f:
         f.write(md_content)
+    output_path = f.name
 
     print(f"✅ Markdown file saved: {output_path}")
     return output_path
 
+# ========================================
+# Pipelined ASR + Translation (long single files)
+# ========================================
+def transcribe_and_translate_pipelined(waveform, audio_key=None):
+    """
+    Translate the chunks of each finished ASR batch while the next batch is still
+    being transcribed. Only worth it when the audio spans several ASR batches
+    (see spans_several_asr_batches); otherwise nothing overlaps.
+
+    ASR runs on the calling thread (GPU); translations run on a thread pool
+    (network), so total time approaches max(ASR, translation) instead of the sum.
+
+    Args:
+        waveform (np.ndarray): Mono float32 waveform at SAMPLE_RATE
+        audio_key (str, optional): Transcript cache key, written as soon as ASR finishes
+
+    Yields:
+        tuple: (chinese_text, english_translation) so far; the last value is final
+    """
+    segments = []
+    futures = []
+
+    def translated_prefix():
+        # The translated segments that are already available, in order
+        done = []
+        for future in futures:
+            if not future.done():
+                break
+            done.append(future.result()[0])
+        return "\n\n".join(done)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+        for segment in iter_transcribe_segments(waveform):
+            segments.append(segment)
+            if segment.strip():
+                futures.append(executor.submit(translate_chinese_to_english_with_status, segment.strip()))
+            yield "".join(segments), translated_prefix()
+
+        # ASR is done: cache the transcript before waiting on translations
+        chinese_text = "".join(segments).strip() or NO_SPEECH_TEXT
+        if audio_key:
+            store_transcript(audio_key, chinese_text)
+
+        # Keep the English box moving while the last translations finish
+        for _ in concurrent.futures.as_completed(futures):
+            yield chinese_text, translated_prefix()
+        results = [future.result() for future in futures]
+
+    english_translation = "\n\n".join(translated for translated, _ in results)
+    print(f"✅ Chinese Transcript: {chinese_text}")
+    # Cache the whole translation only if every segment is complete
+    if results and all(complete for _, complete in results):
+        translation_cache.set(translation_cache_key(chinese_text), english_translation)
+    yield chinese_text, english_translation
+
 # ========================================
 # Gradio Interface Wrapper
 # ========================================
-def process_audio_file(audio_file, need_translation=True):
+def process_audio_file(audio_files, need_translation=True, bulk_mode=False):
     """
     Main processing function for Gradio interface.
+    All uploaded files are transcribed together in one batched ASR call.
+    Results are yielded as soon as each stage finishes: the Chinese
+    transcript first, then the translation (streamed for a single file,
+    packed requests for several files), then the markdown report(s).
 
     Args:
-        audio_file: Gradio file upload (path as string)
+        audio_files: Gradio file upload(s) (path as string, or list of paths)
         need_translation (bool): Whether to translate to English (default: True)
+        bulk_mode (bool): Translate via the Batch API (slower, cheaper) (default: False)
 
-    Returns:
-        tuple: (chinese_text, english_translation, md_file_path)
+    Yields:
+        tuple: (chinese_text, english_translation, md_file_paths)
     """
-    if not audio_file:
-        return "Please upload an audio file.", "", None
+    if not audio_files:
+        yield "Please upload an audio file.", "", None
+        return
 
-    temp_wav = "./temp_input.wav"
+    if isinstance(audio_files, str):
+        audio_files = [audio_files]
 
     try:
         print("\n" + "=" * 60)
-        print("Starting audio processing...")
+        print(f"Starting audio processing ({len(audio_files)} file(s))...")
         print("=" * 60)
 
-        # Step 1: Convert audio to WAV (skip if already WAV)
-        convert_audio_to_wav(audio_file, temp_wav)
+        names = [os.path.basename(audio_file) for audio_file in audio_files]
+        english_translations = [""] * len(audio_files)
 
-        # Step 2: Transcribe
-        chinese_text = transcribe_audio(temp_wav)
+        # Transcript cache: repeat uploads skip decoding and ASR entirely
+        audio_keys = [audio_cache_key(audio_file) for audio_file in audio_files]
+        chinese_texts = [asr_cache.get(key) for key in audio_keys]
+        missing = [i for i, chinese_text in enumerate(chinese_texts) if chinese_text is None]
+        if len(missing) < len(audio_files):
+            print(f"✅ Transcript cache hit for {len(audio_files) - len(missing)} file(s)")
 
-        # Step 3: Translate (optional, based on user choice)
-        if need_translation:
-            english_translation = translate_chinese_to_english_openai(chinese_text)
+        # Step 1: Decode audio to 16kHz mono waveforms in memory (cache misses only)
+        waveforms = {i: load_audio_for_asr(audio_files[i]) for i in missing}
+
+        if (need_translation and not bulk_mode and len(audio_files) == 1
+                and missing and spans_several_asr_batches(waveforms[0])):
+            # Steps 2+3 overlapped: translate finished segments while ASR continues
+            for chinese_text, english_translation in transcribe_and_translate_pipelined(
+                    waveforms[0], audio_keys[0]):
+                yield chinese_text, english_translation, None
+            chinese_texts = [chinese_text]
+            english_translations = [english_translation]
         else:
-            english_translation = ""
-            print("⏭️  Translation skipped (user choice)")
-
-        # Step 4: Generate MD file (with or without translation)
-        md_file = generate_markdown_file(
-            os.path.basename(audio_file),
-            chinese_text,
-            english_translation if need_translation else None
+            # Step 2: Transcribe (single batched call for all uncached files)
+            if missing:
+                new_texts = transcribe_audio_batch([waveforms[i] for i in missing])
+                for i, chinese_text in zip(missing, new_texts):
+                    chinese_texts[i] = chinese_text
+                    # Cache right away so a later disconnect doesn't lose the transcript
+                    store_transcript(audio_keys[i], chinese_text)
+            # Show the Chinese transcript before translation starts
+            yield combine_results(names, chinese_texts), "", None
+
+            # Step 3: Translate (optional, based on user choice)
+            if need_translation and bulk_mode:
+                # Bulk mode: Batch API, results can take minutes
+                yield (
+                    combine_results(names, chinese_texts),
+                    "⏳ Bulk mode: waiting for Batch API results...",
+                    None
+                )
+                english_translations = translate_with_batch_api(chinese_texts)
+            elif need_translation and len(chinese_texts) > 1:
+                # Several files: short transcripts share packed requests
+                english_translations = translate_batch_chinese_to_english_openai(chinese_texts)
+            elif need_translation:
+                # Single file: stream tokens to the UI as they arrive
+                for partial in stream_translate_chinese_to_english_openai(chinese_texts[0]):
+                    english_translations[0] = partial
+                    yield chinese_texts[0], partial, None
+            else:
+                print("⏭️  Translation skipped (user choice)")
+
+        # Show the final translation before writing the reports
+        yield (
+            combine_results(names, chinese_texts),
+            combine_results(names, english_translations),
+            None
         )
 
+        # Step 4: Generate MD files (with or without translation;
+        # a batch that is still running is not a translation)
+        md_files = [
+            generate_markdown_file(
+                name,
+                chinese_text,
+                english_translation
+                if need_translation and not english_translation.startswith(BATCH_PENDING_PREFIX)
+                else None
+            )
+            for name, chinese_text, english_translation
+            in zip(names, chinese_texts, english_translations)
+        ]
+
         print("=" * 60)
         print("✅ Processing completed successfully!")
         print("=" * 60 + "\n")
 
-        return chinese_text, english_translation, md_file
+        yield (
+            combine_results(names, chinese_texts),
+            combine_results(names, english_translations),
+            md_files
+        )
 
     except Exception as e:
         error_msg = f"Processing failed: {str(e)}"
         print(f"❌ {error_msg}")
-        return error_msg, "", None
+        yield error_msg, "", None
 
-    finally:
-        # Clean up temp file
-        if os.path.exists(temp_wav):
-            os.remove(temp_wav)
-            print("🗑️  Cleaned up temporary files")
+def process_audio_file_bulk(audio_files):
+    """
+    Bulk-mode entry point for Gradio: transcribe, then translate via the Batch API.
+    Runs as its own event so a long Batch API wait does not hold up the
+    queue of the main button.
+
+    Args:
+        audio_files: Gradio file upload(s) (path as string, or list of paths)
+
+    Yields:
+        tuple: (chinese_text, english_translation, md_file_paths)
+    """
+    yield from process_audio_file(audio_files, need_translation=True, bulk_mode=True)
+
+def combine_results(names, texts):
+    """
+    Join per-file results for display; a single file is shown without a header.
+
+    Args:
+        names (list[str]): Audio filenames
+        texts (list[str]): Text for each file
+
+    Returns:
+        str: Combined text
+    """
+    if len(texts) == 1:
+        return texts[0]
+    return "\n\n".join(f"[{name}]\n{text}" for name, text in zip(names, texts))
 
 # ========================================
 # Launch Gradio App
@@ -284,13 +1432,13 @@ def process_audio_file(audio_file, need_translation=True):
 with gr.Blocks(title="🎙️ Audio Translator (OpenAI Wrapper)") as demo:
     gr.Markdown("# 🎙️ Chinese Audio to English Translator")
     gr.Markdown(
-        "Upload a **Chinese audio file** (MP3, WAV, etc.), and this tool will: "
+        "Upload one or more **Chinese audio files** (MP3, WAV, etc.), and this tool will: "
         "**transcribe it to Chinese text**, optionally **translate to English** using OpenAI-compatible API, "
         "and export results as a **Markdown (.md) file**."
     )
 
     with gr.Row():
-        audio_input = gr.File(label="Upload Audio File", file_types=["audio"])
+        audio_input = gr.Files(label="Upload Audio File(s)", file_types=["audio"])
 
     # Add translation toggle checkbox
     translation_checkbox = gr.Checkbox(
@@ -300,25 +1448,35 @@ with gr.Blocks(title="🎙️ Audio Translator (OpenAI Wrapper)") as demo:
     )
 
     btn = gr.Button("🚀 Transcribe & Translate")
+    # Batch API button for large offline jobs
+    bulk_btn = gr.Button("📦 Bulk Mode (slower, cheaper): translate via the Batch API")
 
     with gr.Row():
         ch_output = gr.Textbox(label="🇨🇳 Chinese Transcript", lines=6)
         en_output = gr.Textbox(label="🇬🇧 English Translation", lines=6)
 
-    md_output = gr.File(label="📥 Download Markdown Report")
+    md_output = gr.Files(label="📥 Download Markdown Report(s)")
 
     btn.click(
         fn=process_audio_file,
         inputs=[audio_input, translation_checkbox],
         outputs=[ch_output, en_output, md_output]
     )
+    # Separate concurrency limit: waiting on a batch must not block other users
+    bulk_btn.click(
+        fn=process_audio_file_bulk,
+        inputs=[audio_input],
+        outputs=[ch_output, en_output, md_output],
+        concurrency_limit=BULK_CONCURRENCY_LIMIT
+    )
 
     gr.Markdown("💡 Powered by **ModelScope (Paraformer)** + **Qwen API (OpenAI Wrapper)**")
 
 # Run the app
 if __name__ == "__main__":
-    import torch  # Import here to check device
     print("\n" + "=" * 60)
     print("🚀 Starting Gradio App (app.py - OpenAI Wrapper)")
     print("=" * 60)
+    get_asr_pipeline(DEVICE)  # Load model before the first request
+    get_translation_tokenizer()  # Download tokenizer now, not on the shared translation loop
     demo.launch(share=False)  # Set share=True for public link
\ No newline at end of file